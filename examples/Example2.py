@@ -29,3 +29,9 @@ if __name__ == "__main__":
 
     i.multi_evolve()
     print("Best individual had fitness %f" % i.best.fitness)
+
+    # For future runs we save the islands in TinyEvolver's binary
+    # checkpoint format, which is much smaller and faster than pickle and
+    # also keeps the generation and random state. Reload them with
+    # IslandModel.load('islands.tev', sum, mmap=True)
+    i.save('islands.tev')
@@ -8,3 +8,162 @@ bounds = [(0, random.uniform(0, 10)) for _ in range(100)]
 pop = Population(proto, bounds, sum)
 pop.populate(500)
 pop.evolve(100)
+
+# Checkpoint round trips, read into memory and memory-mapped
+import os
+import tempfile
+
+path = os.path.join(tempfile.mkdtemp(), 'checkpoint.tev')
+for proto, bounds in [([1.0] * 10, [(0, 5)] * 10),
+                      ([False] * 10, None),
+                      ([1.0, 1, True], [(0.0, 1.0), (0, 10), (0, 1)])]:
+    saved = Population(proto, bounds, sum)
+    saved.populate(20)
+    saved.evolve(3, verbose=False)
+    saved.save(path)
+    for mmap in (False, True):
+        loaded = Population.load(path, sum, mmap=mmap)
+        assert [list(ind) for ind in loaded] == [list(ind) for ind in saved]
+        assert [ind.fitness for ind in loaded] == [ind.fitness for ind in saved]
+        assert list(loaded.best) == list(saved.best)
+        assert loaded.best.fitness == saved.best.fitness
+        assert loaded._typelist == saved._typelist
+        assert loaded._bounds == saved._bounds
+        assert (loaded.generation, loaded.ngen) == (3, 3)
+        loaded.release()
+        assert loaded._mapping is None
+        assert [list(ind) for ind in loaded] == [list(ind) for ind in saved]
+
+# Saving a mapped population doesn't invalidate genes shared with another one
+saved = Population([1.0] * 10, [(0, 5)] * 10, sum)
+saved.populate(20)
+saved.save(path)
+loaded = Population.load(path, sum, mmap=True)
+shared = Population([1.0] * 10, [(0, 5)] * 10, sum)
+shared.populate(base_population=[ind.genes for ind in loaded])
+loaded.save(path + '2')
+assert [list(ind) for ind in shared] == [list(ind) for ind in saved]
+shared.evolve(1, verbose=False)
+shared.save(path)
+
+# Corrupt checkpoints are rejected, and closed again when memory-mapped
+with open(path, 'rb') as f:
+    data = f.read()
+for corrupt in (b'XXXX' + data[4:], data[:len(data) - 30]):
+    with open(path, 'wb') as f:
+        f.write(corrupt)
+    for mmap in (False, True):
+        try:
+            Population.load(path, sum, mmap=mmap)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Corrupt checkpoint was loaded.")
+
+# Only numeric fitnesses can be saved; paths may be pathlib.Path objects
+ranked = Population([1.0] * 3, None, lambda ind: (sum(ind), 0))
+ranked.populate(5)
+try:
+    ranked.save(path)
+except TypeError:
+    pass
+else:
+    raise AssertionError("Tuple fitnesses were saved.")
+try:
+    from pathlib import Path
+except ImportError:
+    pass
+else:
+    saved.save(Path(path))
+    assert len(Population.load(Path(path), sum)) == len(saved)
+
+os.remove(path)
+os.remove(path + '2')
+print("Checkpoint round trips passed.")
+
+# Integer genes of mixed populations are not limited to 32 bits
+big = Population([1.0, 1], [(0.0, 1.0), (0, 10 ** 12)], sum)
+big.populate(20)
+big.evolve(3, verbose=False)
+big.save(path)
+assert [list(ind) for ind in Population.load(path, sum)] == [list(ind) for ind in big]
+os.remove(path)
+print("Large integer genes passed.")
+
+# Statistics records and sinks
+import csv
+import json
+from tinyevolver import CSVSink, IslandModel, JSONLSink, STATS_FIELDS
+from tinyevolver._stats import diversity, fitness_stats
+
+pop = Population([1, 1], [(0, 3), (0, 3)], sum)
+pop.populate(30)
+fits = [ind.fitness for ind in pop]
+mean = float(sum(fits)) / len(fits)
+best, stats_mean, variance = fitness_stats(pop)
+assert best == max(fits)
+assert abs(stats_mean - mean) < 1e-9
+assert abs(variance - sum((f - mean) ** 2 for f in fits) / len(fits)) < 1e-9
+assert diversity(pop) == float(len(set(tuple(ind) for ind in pop))) / len(pop)
+
+records = []
+pop.observers.append(records.append)
+pop.evolve(3, verbose=False)
+pop.step(5, 3, verbose=False)
+assert [record['generation'] for record in records] == [0, 1, 2, 3]
+for record in records:
+    assert set(record) == set(STATS_FIELDS) - {'island'}
+    assert record['evaluations'] + record['cached'] == len(pop)
+assert records[-1]['max'] == max(ind.fitness for ind in pop)
+assert sum(record['evaluations'] for record in records) == pop.evaluations - 30
+
+jsonl_path = os.path.join(tempfile.mkdtemp(), 'stats.jsonl')
+csv_path = jsonl_path[:-6] + '.csv'
+for mode in ('w', 'a'):
+    sinks = [JSONLSink(jsonl_path, mode), CSVSink(csv_path, mode)]
+    for record in records[:2]:
+        for sink in sinks:
+            sink(record)
+    for sink in sinks:
+        sink.close()
+with open(jsonl_path) as f:
+    assert [json.loads(line) for line in f] == records[:2] * 2
+with open(csv_path) as f:
+    rows = list(csv.reader(f))
+assert rows[0] == STATS_FIELDS and len(rows) == 5
+assert [row[1] for row in rows[1:]] == ['0', '1', '0', '1']
+assert all(row[0] == '' for row in rows[1:])
+os.remove(jsonl_path)
+os.remove(csv_path)
+
+islands = [Population([1.0] * 5, None, sum) for _ in range(3)]
+for island in islands:
+    island.populate(10)
+model = IslandModel(islands)
+records = []
+model.observers.append(records.append)
+model.evolve(2, verbose=False)
+assert [(r['generation'], r['island']) for r in records] == \
+    [(gen, n) for gen in range(2) for n in range(3)]
+print("Statistics records passed.")
+
+# Profiling must not change the course of the evolution
+from tinyevolver import Profiler
+
+
+def profiled_run(profiler):
+    random.seed(42)
+    islands = [Population([1.0, 1, True], [(0.0, 1.0), (0, 10), (0, 1)], sum)
+               for _ in range(2)]
+    for island in islands:
+        island.populate(30)
+    model = IslandModel(islands)
+    model.profiler = profiler
+    model.evolve(10, verbose=False, mig_size=3, mig_freq=2)
+    return [[list(ind) for ind in island] for island in model.islands]
+
+
+profiler = Profiler()
+assert profiled_run(None) == profiled_run(profiler)
+assert profiler.counts['generations'] == 20
+print("Profiled evolution passed.")
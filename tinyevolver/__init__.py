@@ -16,3 +16,5 @@
 """
 from ._core import Individual, Population
 from ._island import IslandModel
+from ._stats import CSVSink, JSONLSink, STATS_FIELDS
+from ._profile import Profiler
@@ -0,0 +1,342 @@
+""" This is part of Python TinyEvolver Copyright (C) 2015 Oliver Margetts
+
+    This script is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+# Compact binary checkpoints for populations.
+#
+# A checkpoint file is laid out as a sequence of 8-byte aligned blocks:
+#
+#     file header   magic, format version, byte order, number of populations
+#     rng state     the state of the `random` module when the file was written
+#     populations   one block per population, each containing a header
+#                   (sizes, generation, best fitness), the gene typecodes,
+#                   the gene bounds, the fitness and valid vectors and then
+#                   one gene matrix per gene type. Matrix rows are the
+#                   prototype, the best individual and then the individuals.
+#
+# Gene matrices are stored in native byte order with the array typecodes the
+# Population already uses ('b', 'i', 'd'), so a homogeneous population can be
+# read back as memoryviews onto a memory-mapped file without copying. Integer
+# genes of mixed populations are held in lists, so they are stored as 64 bit
+# integers ('q') rather than in the 'i' of integer-only populations.
+from array import array
+import mmap
+import numbers
+import os
+import random
+import struct
+import sys
+
+_MAGIC = b'TEVC'
+_VERSION = 1
+_ALIGN = 8
+
+# magic, version, byte order (1 for little endian), number of populations
+_FILE_HEADER = struct.Struct('<4sHBI')
+# random state version, number of state words, gauss_next present, gauss_next
+_RNG_HEADER = struct.Struct('<iI?d')
+# popsize, indsize, generation, ngen, best present, best fitness
+_POP_HEADER = struct.Struct('<IIqq?d')
+
+_CODES = {bool: 'b', int: 'i', float: 'd'}
+_TYPES = {'b': bool, 'i': int, 'q': int, 'd': float}
+_ORDER = 'biqd'
+
+# Array typecodes for the codes above: 'q' is missing before Python 3.3
+try:
+    array('q')
+    _INT64 = 'q'
+except ValueError:
+    _INT64 = 'l' if array('l').itemsize == 8 else None
+_ARRAYS = {'b': 'b', 'i': 'i', 'q': _INT64, 'd': 'd'}
+
+# The Mersenne Twister state is made of 32 bit words
+_WORD = 'I' if array('I').itemsize == 4 else 'L'
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _tobytes(arr):
+    try:
+        return arr.tobytes()
+    except AttributeError:
+        return arr.tostring()
+
+
+def _frombytes(code, data):
+    arr = array(code)
+    try:
+        arr.frombytes(data)
+    except AttributeError:
+        arr.fromstring(data.tobytes())
+    return arr
+
+
+def _aligned(chunks, data):
+    chunks.append(data)
+    chunks.append(b'\0' * (-len(data) % _ALIGN))
+
+
+def _arraycode(code):
+    if _ARRAYS[code] is None:
+        raise ValueError("64 bit integer genes are not supported on this platform.")
+    return _ARRAYS[code]
+
+
+def _row_bytes(genes, code, cols, whole):
+    if whole:
+        if isinstance(genes, array) and genes.typecode == code:
+            return _tobytes(genes)
+        if isinstance(genes, memoryview):
+            return genes.tobytes()
+        return _tobytes(array(code, genes))
+    return _tobytes(array(_arraycode(code), [genes[n] for n in cols]))
+
+
+def _matrix_bytes(rows, code, cols, whole):
+    try:
+        return b''.join(_row_bytes(genes, code, cols, whole) for genes in rows)
+    except OverflowError:
+        for genes in rows:
+            for n in cols:
+                if not -2 ** 63 <= genes[n] < 2 ** 63:
+                    raise ValueError("Gene %d has value %d, which is too large to save."
+                                     % (n, genes[n]))
+        raise
+
+
+def _check_fitness(pop):
+    # Fitnesses are stored as doubles: refuse e.g. tuples before writing anything
+    individuals = pop.individuals if pop.best is None else pop.individuals + [pop.best]
+    for ind in individuals:
+        if ind.valid and not isinstance(ind.fitness, numbers.Real):
+            raise TypeError("Checkpoints can only hold numeric fitness values, not %r."
+                            % (ind.fitness,))
+
+
+def _dump_rng(chunks):
+    version, words, gauss_next = random.getstate()
+    _aligned(chunks, _RNG_HEADER.pack(
+        version, len(words), gauss_next is not None,
+        0.0 if gauss_next is None else gauss_next
+    ))
+    _aligned(chunks, _tobytes(array(_WORD, words)))
+
+
+def _dump_population(chunks, pop):
+    individuals = pop.individuals
+    codes = ''.join(_CODES[t] for t in pop._typelist)
+    if pop._typecode is None:
+        codes = codes.replace('i', 'q')
+    best = pop.best
+
+    _aligned(chunks, _POP_HEADER.pack(
+        len(individuals), pop._indsize, pop.generation, pop.ngen,
+        best is not None, 0.0 if best is None else best.fitness
+    ))
+    _aligned(chunks, codes.encode('ascii'))
+    _aligned(chunks, _tobytes(array('d', [b for pair in pop._bounds for b in pair])))
+    _aligned(chunks, _tobytes(array(
+        'd', [ind.fitness if ind.valid else 0.0 for ind in individuals]
+    )))
+    _aligned(chunks, _tobytes(array('b', [bool(ind.valid) for ind in individuals])))
+
+    rows = [pop._prototype, pop._prototype if best is None else best.genes]
+    rows += [ind.genes for ind in individuals]
+    for code in _ORDER:
+        cols = [n for n, c in enumerate(codes) if c == code]
+        if cols:
+            whole = len(cols) == len(codes)
+            _aligned(chunks, _matrix_bytes(rows, code, cols, whole))
+
+
+def write_checkpoint(path, poplist):
+    """
+    Write the populations in poplist, together with the state of the
+    random module, to a checkpoint file at path. The file is written
+    to a temporary path first and moved into place, so an interrupted
+    write never leaves a truncated checkpoint behind.
+    """
+    for pop in poplist:
+        _check_fitness(pop)
+
+    chunks = []
+    _aligned(chunks, _FILE_HEADER.pack(
+        _MAGIC, _VERSION, sys.byteorder == 'little', len(poplist)
+    ))
+    _dump_rng(chunks)
+    for pop in poplist:
+        _dump_population(chunks, pop)
+
+    tmp = '%s.tmp' % path
+    with open(tmp, 'wb') as f:
+        f.write(b''.join(chunks))
+    _replace(tmp, path)
+
+
+class _Reader(object):
+    # Walks the aligned blocks of a checkpoint held in bytes or an mmap
+
+    def __init__(self, buf, mapped):
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.pos = 0
+        self.mapped = mapped
+        self.swap = False
+        self.views = []
+
+    def _skip(self, nbytes):
+        start = self.pos
+        if start + nbytes > len(self.buf):
+            raise ValueError("Truncated checkpoint file.")
+        self.pos += nbytes + (-nbytes % _ALIGN)
+        return start
+
+    def unpack(self, fmt):
+        start = self._skip(fmt.size)
+        return fmt.unpack_from(self.buf, start)
+
+    def raw(self, nbytes):
+        start = self._skip(nbytes)
+        return self.view[start:start + nbytes].tobytes()
+
+    def array(self, code, length):
+        nbytes = length * array(code).itemsize
+        start = self._skip(nbytes)
+        arr = _frombytes(code, self.view[start:start + nbytes])
+        if self.swap:
+            arr.byteswap()
+        return arr
+
+    def matrix(self, code, nrows, ncols):
+        # Returns a list of rows: views onto the mapped file when possible,
+        # otherwise freshly allocated arrays.
+        code = _arraycode(code)
+        if not (self.mapped and not self.swap):
+            flat = self.array(code, nrows * ncols)
+            return [flat[r * ncols:(r + 1) * ncols] for r in range(nrows)]
+
+        nbytes = nrows * ncols * array(code).itemsize
+        start = self._skip(nbytes)
+        flat = self.view[start:start + nbytes].cast(code)
+        rows = [flat[r * ncols:(r + 1) * ncols] for r in range(nrows)]
+        self.views += rows + [flat]
+        return rows
+
+    def close(self):
+        # After a failed read: release every view onto the mapping and close it
+        if self.mapped:
+            for view in self.views:
+                view.release()
+            self.view.release()
+            self.buf.close()
+
+
+def _load_rng(reader):
+    version, nwords, has_gauss, gauss_next = reader.unpack(_RNG_HEADER)
+    words = reader.array(_WORD, nwords)
+    return version, tuple(words), gauss_next if has_gauss else None
+
+
+def _load_population(reader):
+    (popsize, indsize, generation, ngen,
+     has_best, best_fitness) = reader.unpack(_POP_HEADER)
+    codes = reader.raw(indsize).decode('ascii')
+    flat_bounds = reader.array('d', 2 * indsize)
+    fitness = reader.array('d', popsize)
+    valid = reader.array('b', popsize)
+
+    matrices = []
+    for code in _ORDER:
+        cols = [n for n, c in enumerate(codes) if c == code]
+        if cols:
+            matrices.append((code, cols, reader.matrix(code, popsize + 2, len(cols))))
+
+    if len(matrices) == 1:
+        rows = matrices[0][2]
+    else:
+        rows = []
+        for r in range(popsize + 2):
+            genes = [None] * indsize
+            for code, cols, matrix in matrices:
+                for n, gene in zip(cols, matrix[r]):
+                    genes[n] = _TYPES[code](gene)
+            rows.append(genes)
+
+    bounds = []
+    for n, code in enumerate(codes):
+        lower, upper = flat_bounds[2 * n], flat_bounds[2 * n + 1]
+        if _TYPES[code] is int:
+            lower, upper = int(lower), int(upper)
+        bounds.append((lower, upper))
+
+    best = None
+    if has_best:
+        best = rows[1]
+        if isinstance(best, memoryview):
+            best = array(best.format, best.tobytes())
+        best = (best, best_fitness)
+
+    return {
+        'prototype': [_TYPES[c](g) for c, g in zip(codes, rows[0])],
+        'bounds': bounds,
+        'genes': rows[2:],
+        'fitness': fitness,
+        'valid': valid,
+        'best': best,
+        'generation': generation,
+        'ngen': ngen,
+    }
+
+
+def read_checkpoint(path, use_mmap=False, restore_rng=True):
+    """
+    Read a checkpoint written by write_checkpoint and return a list with
+    one record (a dict) per population. If use_mmap is True, the file is
+    mapped copy-on-write and the genes of homogeneous populations are
+    memoryviews onto the mapping rather than copies. Each record then
+    holds the mmap under 'mapping' (otherwise None), to be closed once
+    those genes are no longer used. If restore_rng is True, the random
+    module is returned to its state at save time.
+    """
+    with open(path, 'rb') as f:
+        if use_mmap and hasattr(memoryview, 'cast'):
+            reader = _Reader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY), True)
+        else:
+            reader = _Reader(f.read(), False)
+
+    try:
+        magic, version, little, npops = reader.unpack(_FILE_HEADER)
+        if magic != _MAGIC:
+            raise ValueError("%s is not a TinyEvolver checkpoint." % path)
+        if version != _VERSION:
+            raise ValueError("Unsupported checkpoint version %d." % version)
+        reader.swap = bool(little) != (sys.byteorder == 'little')
+
+        rng_state = _load_rng(reader)
+        records = [_load_population(reader) for _ in range(npops)]
+    except Exception:
+        reader.close()
+        raise
+
+    for record in records:
+        record['mapping'] = reader.buf if reader.mapped else None
+    if reader.mapped:
+        reader.view.release()
+
+    if restore_rng:
+        random.setstate(rng_state)
+
+    return records
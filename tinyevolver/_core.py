@@ -25,6 +25,9 @@ from array import array
 from copy import copy
 import random
 
+from ._checkpoint import read_checkpoint, write_checkpoint
+from ._stats import clock, fitness_stats, generation_stats
+
 
 class Individual(object):
     """
@@ -53,12 +56,29 @@ class Individual(object):
         return iter(self.genes)
 
     def __copy__(self):
-        new = Individual(copy(self.genes))
+        if type(self.genes) is memoryview:
+            new = Individual(_detach(self.genes))
+        else:
+            new = Individual(copy(self.genes))
         if self.valid:
             new.fitness = self.fitness
             new.valid = True
         return new
 
+    def __getstate__(self):
+        genes = self.genes
+        if type(genes) is memoryview:
+            genes = _detach(genes)
+        return genes, self.fitness, self.valid
+
+    def __setstate__(self, state):
+        self.genes, self.fitness, self.valid = state
+
+
+# Genes mapped from a checkpoint file are memoryviews: copy them into an array
+def _detach(genes):
+    return array(genes.format, genes.tobytes())
+
 
 # Generators for individual genes
 def generator(gene_type, bounds):
@@ -133,9 +153,18 @@ class Population(object):
     Methods:
         populate - add Individuals to this class
         evolve - evolve the individuals using the generated select, mate, mutate functions
+        save - write the population to a binary checkpoint file
+        load - (classmethod) restore a population from a checkpoint file
     Attributes:
         individuals - a list of Individual instances
         best - the fittest individual of all time
+        generation - the number of generations completed in the current run
+        ngen - the number of generations the current run is evolving for
+        evaluations - the total number of calls to the fitness function
+        observers - a list of callables, each called with a dict of statistics
+            (see tinyevolver.STATS_FIELDS) after every generation
+        profiler - None, or a Profiler timing and counting the phases of evolution.
+            Its report is printed at the end of a verbose evolve.
     """
 
     def __init__(self, prototype, gene_bounds, fitness_func):
@@ -147,6 +176,12 @@ class Population(object):
         self._indsize = len(prototype)
         self._fitness = fitness_func
         self.best = None
+        self.generation = 0
+        self.ngen = 0
+        self.evaluations = 0
+        self.observers = []
+        self.profiler = None
+        self._mapping = None
 
         if gene_bounds is None:
             self._bounds = [(-1, 1) for _ in xrange(self._indsize)]
@@ -170,6 +205,8 @@ class Population(object):
         :param base_population: if not None, the popsize variable will be
             ignored and members of this object used as individuals. This
             should be a Population or a list of iterables containing genes.
+            Memoryviews of the population's typecode (e.g. rows of a
+            memory-mapped checkpoint) are used as genes without copying.
         :param popsize: if base_population is None, then this is the number
             of Individuals that will be generated ab initio for the
             Population.
@@ -177,8 +214,12 @@ class Population(object):
         if base_population:
             self.popsize = len(base_population)
             if self._typecode is not None:
-                self.individuals = [Individual(array(self._typecode, ind))
-                                    for ind in base_population]
+                code = self._typecode
+                self.individuals = [
+                    Individual(ind if type(ind) is memoryview and ind.format == code
+                               else array(code, ind))
+                    for ind in base_population
+                ]
             else:
                 self.individuals = [Individual(list(ind)) for ind in base_population]
 
@@ -215,9 +256,12 @@ class Population(object):
                 ind[n] = bool_mutator(gene, indpb)
 
     def _evaluate(self):
+        evaluations = 0
         for ind in self.individuals:
             if not ind.valid:
                 ind.fitness, ind.valid = self._fitness(ind), True
+                evaluations += 1
+        self.evaluations += evaluations
 
         # Also update the record of the best individual
         best = max(self.individuals, key=lambda ind: ind.fitness)
@@ -236,13 +280,88 @@ class Population(object):
     def __iter__(self):
         return iter(self.individuals)
 
+    def __getstate__(self):
+        # Observers are run-time hooks (often holding open files): don't pickle them
+        state = self.__dict__.copy()
+        state['observers'] = []
+        state['_mapping'] = None
+        return state
+
     def __copy__(self):
         new = Population(self._prototype, self._bounds, self._fitness)
         new.populate(base_population=[copy(ind) for ind in self.individuals])
         return new
 
+    def save(self, path):
+        """
+        Write the population, its best individual, the current generation and
+        the state of the random module to a compact binary checkpoint at path.
+        Fitness values must be numeric.
+        """
+        self.release()
+        write_checkpoint(path, [self])
+
+    def release(self):
+        """
+        Copy any genes still mapped from a checkpoint file (see Population.load)
+        into memory and close the file, unless another population loaded from
+        it (or its genes) still uses it. This is done automatically by
+        Population.save.
+        """
+        for ind in self.individuals:
+            if type(ind.genes) is memoryview:
+                # Don't release the view itself: other populations may share it
+                ind.genes = _detach(ind.genes)
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                return
+            self._mapping = None
+
+    @classmethod
+    def load(cls, path, fitness_func, mmap=False, restore_rng=True):
+        """
+        Restore a population saved with Population.save. Fitnesses are restored
+        rather than re-evaluated, so a run can be continued with e.g.
+        pop.evolve(pop.ngen, start_gen=pop.generation).
+        :param fitness_func: the fitness function of the saved population.
+        :param mmap: Boolean - memory-map the file rather than reading it. Genes
+            of single-typed populations then share the (copy-on-write) mapping
+            until they are first copied by selection. The file stays open until
+            the population is saved or Population.release is called.
+        :param restore_rng: Boolean - return the random module to its saved state.
+        """
+        records = read_checkpoint(path, mmap, restore_rng)
+        if len(records) != 1:
+            raise ValueError("%s holds %d populations: use IslandModel.load." %
+                             (path, len(records)))
+        return cls._restore(records[0], fitness_func)
+
+    @classmethod
+    def _restore(cls, record, fitness_func):
+        # Build a population from a record returned by read_checkpoint
+        pop = cls(record['prototype'], record['bounds'], fitness_func)
+        pop.individuals = [Individual(genes) for genes in record['genes']]
+        pop.popsize = len(pop.individuals)
+        for ind, fitness, valid in izip(pop.individuals, record['fitness'],
+                                        record['valid']):
+            if valid:
+                ind.fitness, ind.valid = fitness, True
+
+        if record['best'] is not None:
+            genes, fitness = record['best']
+            pop.best = Individual(genes if pop._typecode else list(genes))
+            pop.best.fitness, pop.best.valid = fitness, True
+
+        pop.generation = record['generation']
+        pop.ngen = record['ngen']
+        pop._mapping = record['mapping']
+        return pop
+
     def evolve(self, ngen=40, matepb=0.3, mutpb=0.2, indpb=0.05,
-               scoping=0, tournsize=3, verbose=True):
+               scoping=0, tournsize=3, verbose=True, start_gen=0,
+               checkpoint=None, checkpoint_freq=0):
         """
         Evolve the population in place
         :param ngen: Positive integer - number of generations to evolve
@@ -255,31 +374,33 @@ class Population(object):
         :param tournsize: Positive integer - size of random pools to select best
             individuals from for next generation.
         :param verbose: Boolean - print statistics to screen (this may slow the evolution)
+        :param start_gen: Non-negative integer - generation to start from, e.g. the
+            generation attribute of a population restored with Population.load.
+        :param checkpoint: if not None, a path to save the population to (see
+            Population.save) every checkpoint_freq generations.
+        :param checkpoint_freq: Non-negative integer - generations between checkpoints.
         """
-        for gen in xrange(ngen):
-            self.individuals = select(self, tournsize=tournsize)
-            for ind1, ind2 in izip(self[::2], self[1::2]):
-                if random.random() < matepb:
-                    self._mate(ind1, ind2)
-                    ind1.valid = False
-                    ind2.valid = False
-                if random.random() < mutpb:
-                    self._mutate(ind1, gen, ngen, indpb, scoping)
-                    ind1.valid = False
-                if random.random() < mutpb:
-                    self._mutate(ind2, gen, ngen, indpb, scoping)
-                    ind2.valid = False
-            self._evaluate()
+        self.ngen = ngen
+        for gen in xrange(start_gen, ngen):
+            if self.observers:
+                start, evaluations = clock(), self.evaluations
+            self._generation(gen, ngen, matepb, mutpb, indpb, scoping, tournsize,
+                             self.profiler)
+            self.generation = gen + 1
+
+            if self.observers:
+                self._notify(gen, self.evaluations - evaluations, clock() - start)
+
+            if checkpoint and checkpoint_freq and self.generation % checkpoint_freq == 0:
+                self.save(checkpoint)
 
             if verbose:
-                fits = [ind.fitness for ind in self]
-                mean = sum(fits) / len(fits)
-                sqdev = [(f - mean) ** 2 for f in fits]
+                best, _, variance = fitness_stats(self)
                 print("--- Generation %d ---" % gen)
-                print(
-                    "    Fitest: %f --- Variance: %f " %
-                    (max(fits), sum(sqdev) / len(sqdev))
-                )
+                print("    Fitest: %f --- Variance: %f " % (best, variance))
+
+        if verbose and self.profiler is not None:
+            print(self.profiler.report())
 
     def step(self, ngen=40, gen=0, matepb=0.3, mutpb=0.2, indpb=0.05,
              scoping=0, tournsize=3, verbose=True):
@@ -288,36 +409,111 @@ class Population(object):
         generation. The ngen and gen parameters are required for scoping
         (see Population.evolve for further details).
         """
+        self._step(ngen, gen, matepb, mutpb, indpb, scoping, tournsize, verbose,
+                   self.profiler)
+
+    def _step(self, ngen, gen, matepb, mutpb, indpb, scoping, tournsize, verbose,
+              profiler, observe=False):
+        # Population.step with the profiler given explicitly (e.g. an IslandModel's).
+        # If observe is True, returns the fitness evaluations made and the time taken
+        # by the generation, for an IslandModel's observers.
+        timed = observe or self.observers
+        if timed:
+            start, evaluations = clock(), self.evaluations
+
+        self._generation(gen, ngen, matepb, mutpb, indpb, scoping, tournsize, profiler)
+        self.ngen = ngen
+        self.generation = gen + 1
+
+        if timed:
+            evaluations, elapsed = self.evaluations - evaluations, clock() - start
+        if self.observers:
+            self._notify(gen, evaluations, elapsed)
+
+        if verbose:
+            best, _, variance = fitness_stats(self)
+            print("    Fitest: %f --- Variance: %f" % (best, variance))
+
+        if observe:
+            return evaluations, elapsed
+
+    def _generation(self, gen, ngen, matepb, mutpb, indpb, scoping, tournsize, profiler):
+        # Select, mate, mutate and evaluate: one generation of evolution. If profiler
+        # is not None each phase is also timed and counted; the calls to the random
+        # module are the same either way, so profiling doesn't change the evolution.
+        timed = profiler is not None
+        if timed:
+            start = clock()
+        winners = tournament(self, tournsize)
+        if timed:
+            copying = clock()
+        self.individuals = [copy(ind) for ind in winners]
+        if timed:
+            evaluations, best = self.evaluations, self.best
+            mating = mutating = 0.0
+            matings = mutations = 0
+            profiler.times['select'] += copying - start
+            profiler.times['copy'] += clock() - copying
 
-        self.individuals = select(self, tournsize=tournsize)
         for ind1, ind2 in izip(self[::2], self[1::2]):
             if random.random() < matepb:
+                if timed:
+                    start = clock()
                 self._mate(ind1, ind2)
+                if timed:
+                    mating += clock() - start
+                    matings += 1
                 ind1.valid = False
                 ind2.valid = False
             if random.random() < mutpb:
+                if timed:
+                    start = clock()
                 self._mutate(ind1, gen, ngen, indpb, scoping)
+                if timed:
+                    mutating += clock() - start
+                    mutations += 1
                 ind1.valid = False
             if random.random() < mutpb:
+                if timed:
+                    start = clock()
                 self._mutate(ind2, gen, ngen, indpb, scoping)
+                if timed:
+                    mutating += clock() - start
+                    mutations += 1
                 ind2.valid = False
-        self._evaluate()
 
-        if verbose:
-            fits = [ind.fitness for ind in self]
-            mean = float(sum(fits)) / len(fits)
-            sqdev = [(f - mean) ** 2 for f in fits]
-            print(
-                "    Fitest: %f --- Variance: %f" % (max(fits), sum(sqdev) / len(sqdev))
-            )
+        if timed:
+            start = clock()
+        self._evaluate()
+        if timed:
+            times, counts = profiler.times, profiler.counts
+            times['mate'] += mating
+            times['mutate'] += mutating
+            times['evaluate'] += clock() - start
+            counts['copies'] += len(winners) + (self.best is not best)
+            counts['matings'] += matings
+            counts['mutations'] += mutations
+            counts['evaluations'] += self.evaluations - evaluations
+            counts['generations'] += 1
+
+    def _notify(self, gen, evaluations, elapsed):
+        record = generation_stats(self, gen, evaluations, elapsed)
+        for observer in self.observers:
+            observer(record)
 
 
 # Select best individuals
 # Defined separately for use with Island class
 def select(pop, tournsize=3, newsize=None):
+    return [copy(ind) for ind in tournament(pop, tournsize, newsize)]
+
+
+def tournament(pop, tournsize=3, newsize=None):
+    # The (uncopied) winners of newsize tournaments
     if newsize is None:
         newsize = len(pop)
+    candidates = list(pop)
     return [
-        copy(max(random.sample(list(pop), tournsize), key=lambda ind: ind.fitness))
+        max(random.sample(candidates, tournsize), key=lambda ind: ind.fitness)
         for _ in xrange(newsize)
     ]
@@ -16,17 +16,23 @@
 """
 
 from copy import copy
+import pickle
 import random
 
 from ._core import Population, select
+from ._checkpoint import read_checkpoint, write_checkpoint
+from ._profile import Profiler
+from ._stats import clock, generation_stats
 from multiprocessing import Pipe, Process, Queue
 from collections import deque
 
 
-def _migrate(poplist, num_migrants):
+def _migrate(poplist, num_migrants, profiler=None):
     """
     Migrate individuals between populations in poplist.
     """
+    if profiler is not None:
+        start = clock()
     popsize = poplist[0].popsize
 
     for n in range(len(poplist)):
@@ -34,16 +40,37 @@ def _migrate(poplist, num_migrants):
         for i in migrant_indices:
             poplist[n][i], poplist[n-1][i] = poplist[n-1][i], poplist[n][i]
 
+    if profiler is not None:
+        profiler.times['migrate'] += clock() - start
+        profiler.counts['migrants'] += num_migrants * len(poplist)
 
-def _migrate_pipe(island, num_migrants, pipe_in, pipe_out):
+
+def _migrate_pipe(island, num_migrants, pipe_in, pipe_out, profiler=None):
     """
     Migrate individuals along pipes in a multiprocessing setup.
     """
+    if profiler is not None:
+        start = clock()
     migrant_indices = random.sample(range(island.popsize), num_migrants)
     emigrants = [copy(island[n]) for n in migrant_indices]
 
-    pipe_out.send(emigrants)
-    buf = pipe_in.recv()
+    if profiler is None:
+        pipe_out.send(emigrants)
+        buf = pipe_in.recv()
+    else:
+        # Pickle by hand to measure the message: this is what send/recv do anyway.
+        # Waiting for the neighbouring island is timed apart from migrating.
+        data = pickle.dumps(emigrants, pickle.HIGHEST_PROTOCOL)
+        pipe_out.send_bytes(data)
+        waiting = clock()
+        received = pipe_in.recv_bytes()
+        unpickling = clock()
+        buf = pickle.loads(received)
+        profiler.times['migrate'] += waiting - start + clock() - unpickling
+        profiler.times['migrate_wait'] += unpickling - waiting
+        profiler.counts['copies'] += len(emigrants)
+        profiler.counts['migrants'] += len(emigrants)
+        profiler.counts['migration_bytes'] += len(data)
 
     for n, immigrant in zip(migrant_indices, buf):
         island[n] = immigrant
@@ -59,7 +86,13 @@ class IslandModel(object):
         island.
         This is useful for periodically introducting 'fresh blood'
         into a saved population - preventing what might be an
-        evolutionary cul-de-sac. """
+        evolutionary cul-de-sac.
+        Observers appended to the observers attribute are called with a
+        statistics record (see Population) for every island and generation,
+        tagged with the island's index under 'island'.
+        If the profiler attribute is a Profiler, it is used in place of the
+        islands' own profilers and also times migration. Profiles from the
+        processes of multi_evolve are merged into it. """
 
     def __init__(self, poplist):
         if len(poplist) < 2:
@@ -71,6 +104,45 @@ class IslandModel(object):
                 raise AttributeError("IslandModel received an empty population.")
             self.islands = poplist
             self.num_islands = len(poplist)
+            self.observers = []
+            self.profiler = None
+
+    def __getstate__(self):
+        # Observers stay with the parent process: see Population.__getstate__
+        state = self.__dict__.copy()
+        state['observers'] = []
+        return state
+
+    def _notify(self, record, island):
+        record['island'] = island
+        for observer in self.observers:
+            observer(record)
+
+    def save(self, path):
+        """
+        Write all of the islands to a single binary checkpoint at path
+        (see Population.save).
+        """
+        self.release()
+        write_checkpoint(path, self.islands)
+
+    def release(self):
+        """
+        Release the checkpoint file the islands were loaded from (see
+        Population.release). This is done automatically by IslandModel.save.
+        """
+        for pop in self.islands:
+            pop.release()
+
+    @classmethod
+    def load(cls, path, fitness_func, mmap=False, restore_rng=True):
+        """
+        Restore an IslandModel saved with IslandModel.save. The run can be
+        continued with e.g. model.evolve(ngen, start_gen=model.islands[0].generation).
+        See Population.load for the remaining parameters.
+        """
+        records = read_checkpoint(path, mmap, restore_rng)
+        return cls([Population._restore(record, fitness_func) for record in records])
 
     @property
     def best(self):
@@ -111,40 +183,68 @@ class IslandModel(object):
         return out_pop
 
     def evolve(self, ngen=40, matepb=0.3, mutpb=0.2, indpb=0.05, scoping=0, tournsize=3,
-               verbose=True, mig_size=5, mig_freq=5):
+               verbose=True, mig_size=5, mig_freq=5, start_gen=0, checkpoint=None,
+               checkpoint_freq=0):
         """
         Evolve the islands and cross-pollinate them with mig_size individuals
-        every mig_freq generations.
+        every mig_freq generations. If checkpoint is a path, the model is saved
+        there every checkpoint_freq generations (see Population.evolve).
         """
-        for gen in range(ngen):
+        for gen in range(start_gen, ngen):
             if verbose:
                 print("--- Generation %d ---" % gen)
-            for pop in self.islands:
-                pop.step(ngen, gen, matepb, mutpb, indpb, scoping, tournsize, verbose)
+            observe = bool(self.observers)
+            for n, pop in enumerate(self.islands):
+                measured = pop._step(ngen, gen, matepb, mutpb, indpb, scoping, tournsize,
+                                     verbose, self.profiler or pop.profiler, observe)
+                if observe:
+                    self._notify(generation_stats(pop, gen, *measured), n)
             if mig_freq and gen % mig_freq == 0:
-                _migrate(self.islands, mig_size)
+                _migrate(self.islands, mig_size, self.profiler)
+            if checkpoint and checkpoint_freq and (gen + 1) % checkpoint_freq == 0:
+                self.save(checkpoint)
 
-    def _multi_evolve(self, pop, ngen, matepb, mutpb, indpb, scoping, tournsize, verbose,
-                      mig_size, mig_freq, proc_no, pipe_in, pipe_out, result_queue):
-        # Evolves and periodically puts/gets migrants from pipes
+        if verbose and self.profiler is not None:
+            print(self.profiler.report())
 
-        for gen in range(ngen):
+    def _multi_evolve(self, pop, ngen, matepb, mutpb, indpb, scoping, tournsize, verbose,
+                      mig_size, mig_freq, start_gen, checkpoint, checkpoint_freq,
+                      observe, profile, proc_no, pipe_in, pipe_out, result_queue):
+        # Evolves and periodically puts/gets migrants from pipes. If observe is
+        # True, statistics records are sent back to the parent on result_queue.
+        # If profile is True, a fresh Profiler is returned for the parent to merge.
+        profiler = Profiler() if profile else pop.profiler
+
+        for gen in range(start_gen, ngen):
             if verbose:
                 print("--- Island %d, Generation %d ---" % (proc_no, gen))
-            pop.step(ngen, gen, matepb, mutpb, indpb, scoping, tournsize, verbose)
+            measured = pop._step(ngen, gen, matepb, mutpb, indpb, scoping, tournsize,
+                                 verbose, profiler, observe)
+            if observe:
+                record = generation_stats(pop, gen, *measured)
+                result_queue.put(('stats', proc_no, record))
             if mig_freq and gen % mig_freq == 0:
-                _migrate_pipe(pop, mig_size, pipe_in, pipe_out)
+                _migrate_pipe(pop, mig_size, pipe_in, pipe_out, profiler)
+            if checkpoint and checkpoint_freq and (gen + 1) % checkpoint_freq == 0:
+                pop.save("%s.%d" % (checkpoint, proc_no))
 
         if verbose:
             print("Evolution done: returning population to queue.")
-        result_queue.put({'pop': list(pop), 'best': pop.best})
+        result_queue.put(('done', proc_no, {
+            'pop': list(pop), 'best': pop.best, 'generation': pop.generation,
+            'ngen': pop.ngen, 'evaluations': pop.evaluations, 'profiler': profiler
+        }))
 
     def multi_evolve(self, ngen=40, matepb=0.3, mutpb=0.2, indpb=0.05, scoping=0,
-                     tournsize=3, verbose=True, mig_size=5, mig_freq=5):
+                     tournsize=3, verbose=True, mig_size=5, mig_freq=5, start_gen=0,
+                     checkpoint=None, checkpoint_freq=0):
         """
         Multiprocessing version of the evolve method, assigning each island its
         own process. If running on Windows this needs to be called from inside
-        a "__main__" function.
+        a "__main__" function. Checkpoints are written by each process to
+        "<checkpoint>.<island number>", one Population checkpoint per island.
+        Statistics records from every process are passed to the observers of
+        this IslandModel in the parent process, as they arrive.
         """
         pipes = [Pipe(False) for _ in range(self.num_islands)]
         pipes_in = deque(pipe[0] for pipe in pipes)
@@ -157,7 +257,9 @@ class IslandModel(object):
             Process(
                 target=self._multi_evolve,
                 args=(self.islands[i], ngen, matepb, mutpb, indpb, scoping, tournsize,
-                      verbose, mig_size, mig_freq, i, pipe_in, pipe_out, q)
+                      verbose, mig_size, mig_freq, start_gen, checkpoint,
+                      checkpoint_freq, bool(self.observers), self.profiler is not None,
+                      i, pipe_in, pipe_out, q)
             )
             for i, (pipe_in, pipe_out) in enumerate(zip(pipes_in, pipes_out))
         ]
@@ -165,7 +267,13 @@ class IslandModel(object):
         for proc in processes:
             proc.start()
 
-        new_pops = [q.get() for _ in processes]
+        new_pops = {}
+        while len(new_pops) < len(processes):
+            kind, proc_no, data = q.get()
+            if kind == 'stats':
+                self._notify(data, proc_no)
+            else:
+                new_pops[proc_no] = data
 
         for proc in processes:
             proc.join()
@@ -173,3 +281,13 @@ class IslandModel(object):
         for n, island in enumerate(self.islands):
             island.individuals = new_pops[n]['pop']
             island.best = new_pops[n]['best']
+            island.generation = new_pops[n]['generation']
+            island.ngen = new_pops[n]['ngen']
+            island.evaluations = new_pops[n]['evaluations']
+            if self.profiler is not None:
+                self.profiler.merge(new_pops[n]['profiler'])
+            else:
+                island.profiler = new_pops[n]['profiler']
+
+        if verbose and self.profiler is not None:
+            print(self.profiler.report())
@@ -0,0 +1,69 @@
+""" This is part of Python TinyEvolver Copyright (C) 2015 Oliver Margetts
+
+    This script is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+from __future__ import division
+
+PHASES = ['select', 'copy', 'mate', 'mutate', 'evaluate', 'migrate', 'migrate_wait']
+COUNTERS = ['generations', 'copies', 'matings', 'mutations', 'evaluations',
+            'migrants', 'migration_bytes']
+
+
+class Profiler(object):
+    """
+    Phase timers and counters for evolution. Attach an instance to the
+    profiler attribute of a Population or IslandModel to switch profiling
+    on, and set it back to None to switch it off.
+
+    Attributes:
+        times - a dict of seconds spent in each of PHASES. With multi_evolve,
+            migrate_wait is the time spent waiting to receive migrants from
+            the neighbouring island: a large value means the islands evolve
+            at different speeds, rather than that migration itself is slow
+        counts - a dict of COUNTERS: generations evolved (per island),
+            individuals copied, matings, mutations, fitness function calls,
+            migrants sent and bytes sent through pipes during migration
+    """
+
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def merge(self, other):
+        """
+        Add the times and counts of another Profiler (e.g. one returned
+        from a worker process) to this one.
+        """
+        for phase in PHASES:
+            self.times[phase] += other.times[phase]
+        for counter in COUNTERS:
+            self.counts[counter] += other.counts[counter]
+
+    def report(self):
+        """
+        Return a summary of the time spent in each phase and of the counters.
+        """
+        total = sum(self.times.values()) or 1.0
+        lines = ["--- Profile: %d generations ---" % self.counts['generations']]
+        for phase in PHASES:
+            lines.append("    %-12s %10.6fs %6.1f%%" %
+                         (phase, self.times[phase], 100 * self.times[phase] / total))
+        lines.append("    " + ", ".join("%s: %d" % (counter.replace('_', ' '),
+                                                     self.counts[counter])
+                                          for counter in COUNTERS[1:]))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
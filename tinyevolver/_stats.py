@@ -0,0 +1,130 @@
+""" This is part of Python TinyEvolver Copyright (C) 2015 Oliver Margetts
+
+    This script is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+from __future__ import division
+import csv
+import json
+
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
+
+
+# Fields of a statistics record, in the order used by CSVSink
+STATS_FIELDS = ['island', 'generation', 'max', 'mean', 'variance', 'diversity',
+                'evaluations', 'cached', 'time']
+
+
+def fitness_stats(pop):
+    """
+    Return the maximum, mean and variance of the fitnesses in pop,
+    computed in a single pass.
+    """
+    best = None
+    mean = 0.0
+    m2 = 0.0
+    for n, ind in enumerate(pop, 1):
+        fitness = ind.fitness
+        if best is None or fitness > best:
+            best = fitness
+        delta = fitness - mean
+        mean += delta / n
+        m2 += delta * (fitness - mean)
+    return best, mean, m2 / len(pop)
+
+
+def diversity(pop):
+    """
+    Return the proportion of individuals in pop with distinct genes. This
+    has to look at every gene of every individual, so it is the dominant
+    cost of observing a run (O(popsize * genes) against O(popsize) for the
+    fitness statistics). Array genes are compared by their raw bytes.
+    """
+    genomes = set()
+    for ind in pop:
+        genes = ind.genes
+        if type(genes) is list:
+            genomes.add(tuple(genes))
+        elif hasattr(genes, 'tobytes'):
+            genomes.add(genes.tobytes())
+        else:
+            genomes.add(genes.tostring())
+    return len(genomes) / len(pop)
+
+
+def generation_stats(pop, gen, evaluations, elapsed):
+    """
+    Return the statistics record passed to observers for one generation.
+    Apart from the diversity (see diversity) it takes one pass over the
+    fitnesses.
+    :param gen: the generation which has just been evolved.
+    :param evaluations: the number of fitness function calls in the generation.
+    :param elapsed: the time in seconds taken by the generation.
+    """
+    best, mean, variance = fitness_stats(pop)
+    return {
+        'generation': gen,
+        'max': best,
+        'mean': mean,
+        'variance': variance,
+        'diversity': diversity(pop),
+        'evaluations': evaluations,
+        # Individuals whose fitness was carried over rather than re-evaluated
+        'cached': len(pop) - evaluations,
+        'time': elapsed,
+    }
+
+
+class JSONLSink(object):
+    """
+    An observer writing each statistics record as a line of JSON to the
+    file at path. Call close() once evolution is finished.
+    """
+
+    def __init__(self, path, mode='w'):
+        self._file = open(path, mode)
+
+    def __call__(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CSVSink(object):
+    """
+    An observer writing each statistics record as a row of a CSV file at
+    path, with a header of STATS_FIELDS. The island column is empty for records
+    from a single population. Call close() once evolution is finished.
+    """
+
+    def __init__(self, path, mode='w'):
+        try:
+            self._file = open(path, mode, newline='')
+        except TypeError:
+            self._file = open(path, mode + 'b')
+        self._writer = csv.DictWriter(self._file, STATS_FIELDS, restval='')
+        if 'a' not in mode or not self._file.tell():
+            self._writer.writeheader()
+
+    def __call__(self, record):
+        self._writer.writerow(record)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()